@@ -1,11 +1,30 @@
 from langchain_anthropic import ChatAnthropic
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from langchain_core.prompt_values import PromptValue
 from pydantic import BaseModel, Field
-from typing import List, Dict
-import json
-from datetime import datetime, timedelta
-from example_input import NEXT_MONTH_WEEKDAYS
+import numpy as np
+from typing import List, Dict, Tuple
+import orjson
+import math
+import hashlib
+import heapq
+import threading
+from collections import OrderedDict, defaultdict, deque
+from functools import lru_cache
+from itertools import starmap
+from datetime import date, datetime
+from config import SLOTS_PER_DAY
+
+_PLAN_LINE = "- Patient ID: {id}, Treatment: {name}, Cost: ${cost}".format_map
+_APPOINTMENT_LINE = "- Date: {date}, Treatment: {treatment}, Patient ID: {patient_id}, Cost: ${cost}".format_map
+_SLOT_LINE = "- Date: {}, Available Slots: {}".format
+
+@lru_cache(maxsize=1)
+def _upcoming_weekdays(today: date) -> Tuple[str, ...]:
+    """Weekdays from today through the next 30 days, recomputed only when the date changes."""
+    start = np.datetime64(today, "D")
+    days = np.arange(start, start + 31)
+    return tuple(days[np.is_busday(days)].astype(str).tolist())
 
 class ScheduledTreatment(BaseModel):
     date: str = Field(description="Date of the treatment in YYYY-MM-DD format")
@@ -20,47 +39,7 @@ class ScheduleOutput(BaseModel):
     analysis: str = Field(description="Brief explanation of the scheduling strategy")
 
 class ScheduleOptimizationAgent:
-    def __init__(self, api_key: str, max_retries: int = 5):
-        self.llm = ChatAnthropic(model="claude-3-sonnet-20240229", anthropic_api_key=api_key)
-        self.output_parser = PydanticOutputParser(pydantic_object=ScheduleOutput)
-        self.max_retries = max_retries
-
-    def optimize_schedule(self, partial_schedule: List[Dict], treatment_plans: List[Dict], revenue_target: float) -> Dict:
-        """Optimize the doctor's schedule using Claude-3.5-sonnet with retry mechanism."""
-        available_slots = self._get_available_slots(partial_schedule)
-        prompt = self._create_prompt(partial_schedule, treatment_plans, revenue_target, available_slots)
-        
-        for attempt in range(self.max_retries):
-            try:
-                response = self._get_claude_response(prompt)
-                return self._parse_response(response)
-            except Exception as e:
-                if attempt == self.max_retries - 1:
-                    return {"error": f"Failed to parse the AI response after {self.max_retries} attempts: {str(e)}"}
-                print(f"Attempt {attempt + 1} failed. Retrying...")
-
-    def _get_available_slots(self, partial_schedule: List[Dict]) -> Dict[str, int]:
-        """Calculate available slots for each weekday in the next month."""
-        today = datetime.now().date()
-        end_date = today + timedelta(days=30)
-        date_range = [today + timedelta(days=x) for x in range((end_date - today).days + 1) if (today + timedelta(days=x)).weekday() < 5]
-        
-        available_slots = {date.strftime("%Y-%m-%d"): 3 for date in date_range}
-        
-        for appointment in partial_schedule:
-            date = appointment['date']
-            if date in available_slots:
-                available_slots[date] -= 1
-        
-        return {date: slots for date, slots in available_slots.items() if slots > 0}
-
-    def _create_prompt(self, partial_schedule: List[Dict], treatment_plans: List[Dict], revenue_target: float, available_slots: Dict[str, int]) -> str:
-        """Create a detailed prompt for the Claude model."""
-        formatted_plans = self._format_treatment_plans(treatment_plans)
-        formatted_partial_schedule = self._format_partial_schedule(partial_schedule)
-        formatted_available_slots = self._format_available_slots(available_slots)
-        
-        template = """As an AI scheduling assistant specializing in healthcare optimization, your task is to complete a partial schedule for a doctor based on the following parameters:
+    PROMPT_TEMPLATE = """As an AI scheduling assistant specializing in healthcare optimization, your task is to complete a partial schedule for a doctor based on the following parameters:
 
         Partial Schedule:
         {formatted_partial_schedule}
@@ -79,7 +58,7 @@ class ScheduleOptimizationAgent:
         2. Ensure a balanced mix of treatments to avoid overbooking any single type.
         3. If the revenue target can't be met, get as close as possible.
         4. Spread out treatments for each patient (identified by patient_id) so they don't have multiple appointments on the same day.
-        5. Respect the maximum of 3 appointments per day.
+        5. Respect the maximum of {slots_per_day} appointments per day.
         6. Only schedule appointments on weekdays (Monday to Friday).
         7. Use only the dates provided in the Available Slots section.
 
@@ -90,42 +69,189 @@ class ScheduleOptimizationAgent:
         4. Calculate the total revenue for the complete schedule.
         5. Determine if the revenue target is met.
 
-        {format_instructions}
-
         Remember, you are an AI assistant focused on optimizing healthcare schedules. Provide your best solution based on the given constraints and objectives.
         """
+
+    def __init__(self, api_key: str, max_retries: int = 5, cache_size: int = 1024):
+        self.llm = ChatAnthropic(model="claude-3-sonnet-20240229", anthropic_api_key=api_key, max_retries=max_retries, default_request_timeout=60)
+        self.structured_llm = self.llm.with_structured_output(ScheduleOutput)
+        self._prompt_template = ChatPromptTemplate.from_template(self.PROMPT_TEMPLATE)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def optimize_schedule(self, partial_schedule: List[Dict], treatment_plans: List[Dict], revenue_target: float, use_llm: bool = False, fill_all_slots: bool = True) -> Dict:
+        """Optimize the doctor's schedule with the greedy solver, or Claude-3.5-sonnet tool use if use_llm is set.
+
+        With fill_all_slots=False the greedy solver stops as soon as the revenue target is met. Claude is
+        skipped whenever the highest-cost plans cannot reach the target even with every open slot filled.
+        """
+        available_slots = self._get_available_slots(partial_schedule)
+        if not use_llm or self._revenue_upper_bound(partial_schedule, treatment_plans, available_slots) < revenue_target:
+            return self._solve_greedy(partial_schedule, treatment_plans, revenue_target, available_slots, fill_all_slots)
+
+        cache_key = self._cache_key(partial_schedule, treatment_plans, revenue_target)
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return orjson.loads(cached)
+
+        prompt = self._create_prompt(partial_schedule, treatment_plans, revenue_target, available_slots)
+        
+        try:
+            response = self._get_claude_response(prompt)
+        except Exception as e:
+            return {"error": f"Failed to get a structured schedule from the AI: {str(e)}"}
+
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self._cache[cache_key] = response.model_dump_json()
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return response.model_dump()
+
+    def _cache_key(self, partial_schedule: List[Dict], treatment_plans: List[Dict], revenue_target: float) -> str:
+        """Hash the request inputs together with today's date, since available slots depend on it."""
+        payload = orjson.dumps({
+            "today": datetime.now().date().isoformat(),
+            "partial_schedule": partial_schedule,
+            "plans": treatment_plans,
+            "target": revenue_target
+        }, option=orjson.OPT_SORT_KEYS)
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def _get_available_slots(self, partial_schedule: List[Dict]) -> Dict[str, int]:
+        """Calculate available slots for each weekday in the next month."""
+        available_slots = dict.fromkeys(_upcoming_weekdays(datetime.now().date()), SLOTS_PER_DAY)
         
-        prompt = ChatPromptTemplate.from_template(template)
+        for appointment in partial_schedule:
+            date = appointment['date']
+            if date in available_slots:
+                available_slots[date] -= 1
         
-        return prompt.format(
+        return {date: slots for date, slots in available_slots.items() if slots > 0}
+
+    def _revenue_upper_bound(self, partial_schedule: List[Dict], treatment_plans: List[Dict], available_slots: Dict[str, int]) -> float:
+        """Revenue if every open slot were filled with the most expensive remaining plans, ignoring patient conflicts."""
+        top_costs = heapq.nlargest(sum(available_slots.values()), (plan['cost'] for plan in treatment_plans))
+        return math.fsum(appointment['cost'] for appointment in partial_schedule) + math.fsum(top_costs)
+
+    def _solve_greedy(self, partial_schedule: List[Dict], treatment_plans: List[Dict], revenue_target: float, available_slots: Dict[str, int], fill_all_slots: bool = True) -> Dict:
+        """Take treatments by descending cost, keeping each one that still fits once earlier bookings are reshuffled.
+
+        Schedulable sets of treatments form a matroid (a patient may hold one slot per day, each day has a fixed
+        capacity), so this greedy selection maximizes revenue. Fit is checked with an augmenting path over days.
+        """
+        open_slots = dict(available_slots)
+        assigned = {date: [] for date in open_slots}
+        patient_days = defaultdict(set)
+        for appointment in partial_schedule:
+            if appointment['date'] in open_slots:
+                patient_days[appointment['patient_id']].add(appointment['date'])
+
+        costs = np.fromiter((plan['cost'] for plan in treatment_plans), dtype=np.float64, count=len(treatment_plans))
+        patient_ids = np.fromiter((plan['id'] for plan in treatment_plans), dtype=np.int64, count=len(treatment_plans))
+        order = np.argsort(-costs, kind="stable")
+
+        chosen_plans = defaultdict(list)
+        unplaceable_patients = set()
+        remaining_slots = sum(open_slots.values())
+        revenue = math.fsum(appointment['cost'] for appointment in partial_schedule)
+        for index, patient_id in zip(order.tolist(), patient_ids[order].tolist()):
+            if not remaining_slots or (not fill_all_slots and revenue >= revenue_target):
+                break
+            # Adding plans only shrinks what else fits, so a patient that failed once never fits again
+            if patient_id in unplaceable_patients:
+                continue
+            if not self._book_with_augmenting_path(patient_id, open_slots, assigned, patient_days):
+                unplaceable_patients.add(patient_id)
+                continue
+            chosen_plans[patient_id].append(treatment_plans[index])
+            remaining_slots -= 1
+            revenue += treatment_plans[index]['cost']
+
+        schedule = list(partial_schedule)
+        pending_plans = {patient_id: iter(plans) for patient_id, plans in chosen_plans.items()}
+        for date, day_patients in assigned.items():
+            for patient_id in day_patients:
+                plan = next(pending_plans[patient_id])
+                schedule.append({"date": date, "treatment": plan['name'], "patient_id": plan['id'], "cost": plan['cost']})
+
+        scheduled_count = len(schedule) - len(partial_schedule)
+        total_revenue = math.fsum(appointment['cost'] for appointment in schedule)
+        return {
+            "schedule": schedule,
+            "total_revenue": total_revenue,
+            "revenue_target_met": total_revenue >= revenue_target,
+            "analysis": f"Filled {scheduled_count} open slots by taking treatments from highest to lowest cost and keeping "
+                        f"each one that could still be placed, shifting earlier bookings to other weekdays where needed "
+                        f"so that no patient has two appointments on the same day."
+        }
+
+    def _book_with_augmenting_path(self, patient_id: int, open_slots: Dict[str, int], assigned: Dict[str, List[int]], patient_days: Dict[int, set]) -> bool:
+        """Book one more day for patient_id, moving solver-placed patients between days if that frees one."""
+        parents = {}
+        queue = deque()
+        for date in open_slots:
+            if date not in patient_days[patient_id]:
+                parents[date] = None
+                queue.append(date)
+
+        while queue:
+            date = queue.popleft()
+            if open_slots[date] > 0:
+                break
+            for moved_patient in assigned[date]:
+                for next_date in open_slots:
+                    if next_date not in parents and next_date not in patient_days[moved_patient]:
+                        parents[next_date] = (date, moved_patient)
+                        queue.append(next_date)
+        else:
+            return False
+
+        open_slots[date] -= 1
+        while parents[date] is not None:
+            previous_date, moved_patient = parents[date]
+            assigned[previous_date].remove(moved_patient)
+            patient_days[moved_patient].discard(previous_date)
+            assigned[date].append(moved_patient)
+            patient_days[moved_patient].add(date)
+            date = previous_date
+        assigned[date].append(patient_id)
+        patient_days[patient_id].add(date)
+        return True
+
+    def _create_prompt(self, partial_schedule: List[Dict], treatment_plans: List[Dict], revenue_target: float, available_slots: Dict[str, int]) -> PromptValue:
+        """Create a detailed prompt for the Claude model, listing only the plans it could plausibly book."""
+        candidate_plans = heapq.nlargest(2 * sum(available_slots.values()), treatment_plans, key=lambda plan: plan['cost'])
+        formatted_plans = self._format_treatment_plans(candidate_plans)
+        omitted_count = len(treatment_plans) - len(candidate_plans)
+        if omitted_count:
+            formatted_plans += f"\n- Plus {omitted_count} lower-cost alternatives not listed."
+        formatted_partial_schedule = self._format_partial_schedule(partial_schedule)
+        formatted_available_slots = self._format_available_slots(available_slots)
+        
+        return self._prompt_template.format_prompt(
             formatted_partial_schedule=formatted_partial_schedule,
             formatted_available_slots=formatted_available_slots,
             formatted_plans=formatted_plans,
             revenue_target=revenue_target,
-            format_instructions=self.output_parser.get_format_instructions()
+            slots_per_day=SLOTS_PER_DAY
         )
 
-    def _get_claude_response(self, prompt: str) -> str:
-        """Get a response from the Claude model."""
-        response = self.llm.predict(prompt)
-        return response
-
-    def _parse_response(self, response: str) -> Dict:
-        """Parse the Claude response into a structured format."""
-        try:
-            parsed_output = self.output_parser.parse(response)
-            return parsed_output.dict()
-        except Exception as e:
-            raise Exception(f"Failed to parse the AI response: {str(e)}")
+    def _get_claude_response(self, prompt: PromptValue) -> ScheduleOutput:
+        """Get a schedule from the Claude model, returned through forced tool use and validated against ScheduleOutput."""
+        return self.structured_llm.invoke(prompt)
 
     def _format_treatment_plans(self, treatment_plans: List[Dict]) -> str:
         """Format treatment plans for the prompt."""
-        return "\n".join([f"- Patient ID: {plan['id']}, Treatment: {plan['name']}, Cost: ${plan['cost']}" for plan in treatment_plans])
+        return "\n".join(map(_PLAN_LINE, treatment_plans))
 
     def _format_partial_schedule(self, partial_schedule: List[Dict]) -> str:
         """Format partial schedule for the prompt."""
-        return "\n".join([f"- Date: {appt['date']}, Treatment: {appt['treatment']}, Patient ID: {appt['patient_id']}, Cost: ${appt['cost']}" for appt in partial_schedule])
+        return "\n".join(map(_APPOINTMENT_LINE, partial_schedule))
 
     def _format_available_slots(self, available_slots: Dict[str, int]) -> str:
         """Format available slots for the prompt."""
-        return "\n".join([f"- Date: {date}, Available Slots: {slots}" for date, slots in available_slots.items()])
+        return "\n".join(starmap(_SLOT_LINE, available_slots.items()))
@@ -1,13 +1,30 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from agent import ScheduleOptimizationAgent
 import os
 from dotenv import load_dotenv
-import json
-from datetime import datetime, timedelta
+import orjson
+from datetime import date, datetime
 
 load_dotenv()
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson."""
+
+    def dumps(self, obj, **kwargs):
+        # Hand dates to Flask's default so they stay HTTP dates, and accept non-str keys like stdlib json
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+_AGENT = ScheduleOptimizationAgent(api_key=os.getenv('ANTHROPIC_API_KEY'))
 
 # Example treatment plans for testing
 example_treatment_plans = [
@@ -26,18 +43,19 @@ example_treatment_plans = [
 # Generate example partial schedule for the next 5 weekdays
 def generate_example_partial_schedule():
     partial_schedule = []
-    current_date = datetime.now().date()
+    day_ordinal = datetime.now().date().toordinal()
     weekdays_added = 0
     while weekdays_added < 5:
+        current_date = date.fromordinal(day_ordinal)
         if current_date.weekday() < 5: 
             partial_schedule.append({
-                "date": current_date.strftime("%Y-%m-%d"),
+                "date": current_date.isoformat(),
                 "treatment": "Basic Checkup",
                 "patient_id": weekdays_added + 1,
                 "cost": 100
             })
             weekdays_added += 1
-        current_date += timedelta(days=1)
+        day_ordinal += 1
     return partial_schedule
 
 @app.route('/optimize_schedule', methods=['POST'])
@@ -46,28 +64,25 @@ def api_optimize_schedule():
     partial_schedule = data['partial_schedule']
     treatment_plans = data['treatment_plans']
     revenue_target = data['revenue_target']
+    use_llm = data.get('use_llm', False)
+    fill_all_slots = data.get('fill_all_slots', True)
     
-    api_key = os.getenv('ANTHROPIC_API_KEY')
-    
-    agent = ScheduleOptimizationAgent(api_key=api_key)
-    result = agent.optimize_schedule(partial_schedule, treatment_plans, revenue_target)
+    result = _AGENT.optimize_schedule(partial_schedule, treatment_plans, revenue_target, use_llm=use_llm, fill_all_slots=fill_all_slots)
     return jsonify(result)
 
 def test_optimize_schedule_locally():
     revenue_target = 10000
     example_partial_schedule = generate_example_partial_schedule()
 
-    api_key = os.getenv('ANTHROPIC_API_KEY')
-    
-    agent = ScheduleOptimizationAgent(api_key=api_key)
-    result = agent.optimize_schedule(example_partial_schedule, example_treatment_plans, revenue_target)
+    result = _AGENT.optimize_schedule(example_partial_schedule, example_treatment_plans, revenue_target)
     print("Optimization Result:")
-    print(json.dumps(result, indent=2))
+    result_json = orjson.dumps(result, option=orjson.OPT_INDENT_2)
+    print(result_json.decode())
 
     # Output the result to a JSON file
     output_file = 'optimized_schedule.json'
-    with open(output_file, 'w') as f:
-        json.dump(result, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(result_json)
     print(f"Optimized schedule has been saved to {output_file}")
 
 if __name__ == '__main__':
@@ -0,0 +1 @@
+SLOTS_PER_DAY = 3  # Maximum appointments per weekday
@@ -1,49 +1,110 @@
-import random
-from datetime import datetime, timedelta
-import calendar
-
-def generate_example_input(num_appointments=720):
-    treatments = [
-        {"name": "Basic Checkup", "cost": 100},
-        {"name": "Dental Cleaning", "cost": 150},
-        {"name": "Cavity Filling", "cost": 200},
-        {"name": "Root Canal", "cost": 800},
-        {"name": "Tooth Extraction", "cost": 250},
-        {"name": "Dental Crown", "cost": 1000},
-        {"name": "Teeth Whitening", "cost": 300},
-        {"name": "Dental Implant", "cost": 3000},
-        {"name": "Orthodontic Consultation", "cost": 150},
-        {"name": "Wisdom Tooth Removal", "cost": 450}
+import os
+import sys
+from collections import namedtuple
+from functools import cache
+import numpy as np
+from datetime import datetime
+from config import SLOTS_PER_DAY
+
+Treatment = namedtuple("Treatment", "name cost")
+
+TREATMENTS = (
+    Treatment("Basic Checkup", 100),
+    Treatment("Dental Cleaning", 150),
+    Treatment("Cavity Filling", 200),
+    Treatment("Root Canal", 800),
+    Treatment("Tooth Extraction", 250),
+    Treatment("Dental Crown", 1000),
+    Treatment("Teeth Whitening", 300),
+    Treatment("Dental Implant", 3000),
+    Treatment("Orthodontic Consultation", 150),
+    Treatment("Wisdom Tooth Removal", 450)
+)
+TREATMENT_NAMES = tuple(t.name for t in TREATMENTS)
+TREATMENT_COSTS = np.array([t.cost for t in TREATMENTS], dtype=np.int32)
+TREATMENT_DTYPE = np.dtype([("id", np.int32), ("name_idx", np.int8), ("cost", np.int32)])
+_RNG = np.random.default_rng()
+EXAMPLE_PLANS_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "schedule-agent", "example_plans.npy"
+)
+
+def _rng_for(seed):
+    return _RNG if seed is None else np.random.default_rng(seed)
+
+def _sample_plans(rng, num_appointments):
+    plans = np.empty(num_appointments, dtype=TREATMENT_DTYPE)
+    plans["id"] = rng.integers(1, 101, size=num_appointments, dtype=np.int32)  # Assuming 100 different patients
+    plans["name_idx"] = rng.integers(0, len(TREATMENTS), size=num_appointments, dtype=np.int8)
+    plans["cost"] = TREATMENT_COSTS[plans["name_idx"]]
+    return plans
+
+def generate_example_input(num_appointments=720, seed=None):
+    return _sample_plans(_rng_for(seed), num_appointments)
+
+def load_example_input(num_appointments=720, cache_path=EXAMPLE_PLANS_PATH):
+    """Memory-map cached example plans from the user cache dir, generating and saving them if missing or unreadable."""
+    try:
+        plans = np.load(cache_path, mmap_mode="r")
+        if plans.dtype == TREATMENT_DTYPE and plans.shape == (num_appointments,):
+            return plans
+    except (OSError, ValueError, EOFError):
+        pass  # Missing, truncated or foreign file; regenerate it below
+
+    plans = generate_example_input(num_appointments)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.save(f, plans)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Unwritable cache dir; regenerate next time
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return plans
+
+def as_dicts(plans):
+    """Expand a TREATMENT_DTYPE array into the {"id", "name", "cost"} dicts the agent expects."""
+    return [
+        {"id": patient_id, "name": TREATMENT_NAMES[name_idx], "cost": cost}
+        for patient_id, name_idx, cost in zip(plans["id"].tolist(), plans["name_idx"].tolist(), plans["cost"].tolist())
     ]
 
-    example_treatment_plans = []
-    for i in range(num_appointments):
-        patient_id = random.randint(1, 100)  # Assuming 100 different patients
-        treatment = random.choice(treatments)
-        example_treatment_plans.append({
-            "id": patient_id,
-            "name": treatment["name"],
-            "cost": treatment["cost"]
-        })
+def iter_example_plans(num_appointments=720, seed=None, batch_size=1024):
+    """Yield freshly sampled example plans as (id, name, cost) tuples, drawing batch_size rows at a time."""
+    rng = _rng_for(seed)
+    for start in range(0, num_appointments, batch_size):
+        plans = _sample_plans(rng, min(batch_size, num_appointments - start))
+        names = map(TREATMENT_NAMES.__getitem__, plans["name_idx"].tolist())
+        yield from zip(plans["id"].tolist(), names, plans["cost"].tolist())
 
-    return example_treatment_plans
+@cache
+def get_example_plans(num_appointments=720):
+    """Example treatment plans as dicts, loaded on first use rather than at import."""
+    return as_dicts(load_example_input(num_appointments))
 
+@cache
 def get_next_month_weekdays():
     today = datetime.now()
-    next_month = today.replace(day=1) + timedelta(days=32)
-    first_day = next_month.replace(day=1)
-    _, last_day = calendar.monthrange(first_day.year, first_day.month)
-    last_date = first_day.replace(day=last_day)
-
-    weekdays = []
-    current_day = first_day
-    while current_day <= last_date:
-        if current_day.weekday() < 5:  # Monday = 0, Friday = 4
-            weekdays.append(current_day.strftime("%Y-%m-%d"))
-        current_day += timedelta(days=1)
-    
-    return weekdays
-
-EXAMPLE_TREATMENT_PLANS = generate_example_input(720)
-NEXT_MONTH_WEEKDAYS = get_next_month_weekdays()
-NUM_SLOTS = 720  # Fixed number of slots
\ No newline at end of file
+    nm_year, nm_month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+    first_day = np.datetime64(f"{nm_year:04d}-{nm_month:02d}-01")
+    next_first_day = (first_day.astype("datetime64[M]") + 1).astype("datetime64[D]")
+
+    days = np.arange(first_day, next_first_day)
+    return tuple(map(sys.intern, days[np.is_busday(days)].astype("U10").tolist()))  # Monday to Friday
+
+def get_num_slots():
+    """Total appointment capacity for next month's weekdays."""
+    return len(get_next_month_weekdays()) * SLOTS_PER_DAY
+
+_LAZY_CONSTANTS = {
+    "EXAMPLE_TREATMENT_PLANS": get_example_plans,
+    "NEXT_MONTH_WEEKDAYS": get_next_month_weekdays,
+    "NUM_SLOTS": get_num_slots,
+}
+
+def __getattr__(name):
+    # Keep `from example_input import EXAMPLE_TREATMENT_PLANS` working without computing it at import
+    if name in _LAZY_CONSTANTS:
+        return _LAZY_CONSTANTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file